@@ -1,22 +1,56 @@
 from typing import List, Dict, Any, Optional
 from pathlib import Path
 
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
 from ibm_watsonx_orchestrate.agent_builder.tools import tool
 from datetime import date, timedelta
-from base64 import b64encode, urlsafe_b64decode
+from collections import defaultdict, deque
+
+try:
+    # SIMD-accelerated drop-in; receipts run 100KB-5MB so the encode/decode
+    # passes are measurable next to stdlib base64
+    from pybase64 import b64encode, urlsafe_b64decode
+except ImportError:  # pragma: no cover
+    from base64 import b64encode, urlsafe_b64decode
 
 from googleapiclient.errors import HttpError
 
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
-from PyPDF2 import PdfReader
 import re
 from pathlib import Path
 import requests
 
+import copy
+import functools
 import io
-import base64
+import hashlib
+import sqlite3
+import threading
+import time
+
+try:
+    import orjson  # Rust JSON codec, 2-5x faster than stdlib on API payloads
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import re2  # linear-time RE2 engine; optional accelerator for OCR scans
+except ImportError:  # pragma: no cover
+    re2 = None
+
+
+def _compile_pattern(pattern: str, flags: int = 0):
+    """Compile a hot-path regex with RE2 when installed, stdlib re otherwise.
+
+    The amount patterns have no backreferences, so RE2 can run them in
+    guaranteed linear time over large OCR blobs.
+    """
+    if re2 is not None:
+        try:
+            return re2.compile(pattern, flags)
+        except Exception:  # pattern not supported by RE2
+            pass
+    return re.compile(pattern, flags)
 # import pandas as pd
 
 
@@ -28,6 +62,7 @@ TOKEN_PATH = BASE_DIR / "token.json"
 VISION_KEY_PATH = Path(__file__).resolve().parent.parent / "vision_api_key.txt"
 
 
+@functools.lru_cache(maxsize=1)
 def _get_vision_api_key() -> str | None:
     try:
         return VISION_KEY_PATH.read_text(encoding="utf-8").strip()
@@ -35,11 +70,95 @@ def _get_vision_api_key() -> str | None:
         return None
 
 
+_GMAIL_SERVICE = None
+_GMAIL_CREDS = None
+_GMAIL_LOCK = threading.Lock()
+
+
 def _get_gmail_service():
-    """Load token.json from the tool package and build a Gmail service."""
-    creds = Credentials.from_authorized_user_file(str(TOKEN_PATH), SCOPES)
-    service = build("gmail", "v1", credentials=creds)
-    return service
+    """
+    Return a Gmail service, built once and cached at module scope.
+
+    Credentials are parsed from token.json a single time and refreshed
+    in memory when they expire; token.json is only written back when the
+    access token actually rotates. Rebuilding the service on every tool
+    call would re-read the token file and re-parse the discovery
+    document; caching it (and using the static discovery doc shipped
+    with googleapiclient) removes that overhead.
+    """
+    global _GMAIL_SERVICE, _GMAIL_CREDS
+    with _GMAIL_LOCK:
+        # Imported here so tool paths that never touch Gmail discovery
+        # (and module cold start) skip the googleapiclient import tax.
+        if _GMAIL_CREDS is None:
+            from google.oauth2.credentials import Credentials
+
+            _GMAIL_CREDS = Credentials.from_authorized_user_file(
+                str(TOKEN_PATH), SCOPES
+            )
+
+        if _GMAIL_CREDS.expired and _GMAIL_CREDS.refresh_token:
+            from google.auth.transport.requests import Request
+
+            old_token = _GMAIL_CREDS.token
+            _GMAIL_CREDS.refresh(Request())
+            if _GMAIL_CREDS.token != old_token:
+                TOKEN_PATH.write_text(_GMAIL_CREDS.to_json(), encoding="utf-8")
+
+        if _GMAIL_SERVICE is None:
+            from googleapiclient.discovery import build
+
+            build_kwargs: Dict[str, Any] = {}
+            if orjson is not None:
+                build_kwargs["model"] = _make_orjson_model()
+            _GMAIL_SERVICE = build(
+                "gmail",
+                "v1",
+                credentials=_GMAIL_CREDS,
+                cache_discovery=False,
+                static_discovery=True,
+                **build_kwargs,
+            )
+    return _GMAIL_SERVICE
+
+
+def _make_orjson_model():
+    """Build a googleapiclient model that decodes responses with orjson."""
+    from googleapiclient.model import JsonModel
+
+    class _OrjsonModel(JsonModel):
+        def deserialize(self, content):
+            body = orjson.loads(content)
+            if self._data_wrapper and "data" in body:
+                body = body["data"]
+            return body
+
+    return _OrjsonModel()
+
+
+_THREAD_HTTP = threading.local()
+
+
+def _get_thread_http():
+    """
+    Authorized httplib2 transport private to the calling thread.
+
+    httplib2.Http is not thread-safe and the cached service holds a
+    single instance, so every request that can run concurrently — batch
+    executes, the threaded fallbacks, and anything reached from the
+    export tool's per-email workers — must carry its own transport via
+    execute(http=...). The request objects still come from the shared
+    service, so the fields masks and orjson model apply unchanged.
+    """
+    http = getattr(_THREAD_HTTP, "http", None)
+    if http is None:
+        import httplib2
+        from google_auth_httplib2 import AuthorizedHttp
+
+        _get_gmail_service()  # loads (and refreshes) _GMAIL_CREDS
+        http = AuthorizedHttp(_GMAIL_CREDS, http=httplib2.Http())
+        _THREAD_HTTP.http = http
+    return http
 
 
 def _get_current_week_range_until_today():
@@ -64,13 +183,284 @@ def _get_current_week_range_until_today():
 
 
 VISION_ENDPOINT = "https://vision.googleapis.com/v1/images:annotate"
+VISION_FILES_ENDPOINT = "https://vision.googleapis.com/v1/files:annotate"
+
+
+def _make_vision_session() -> requests.Session:
+    """One keep-alive session for all Vision calls.
 
+    Reusing the TLS connection amortizes the handshake across receipts, and
+    the mounted retry adapter absorbs Vision's transient 429/5xx responses.
+    """
+    from requests.adapters import HTTPAdapter, Retry
+
+    session = requests.Session()
+    session.mount(
+        "https://",
+        HTTPAdapter(
+            pool_connections=8,
+            pool_maxsize=16,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=None,  # retry POSTs too; annotate is idempotent
+            ),
+        ),
+    )
+    return session
+
+
+@functools.lru_cache(maxsize=1)
+def _get_vision_session() -> requests.Session:
+    """Build the shared Vision session on first OCR call, not at import."""
+    return _make_vision_session()
+
+
+# Receipt images are immutable, so OCR results can be reused across runs
+# (the weekly export re-analyzes the same emails daily). Content-addressed
+# sqlite cache; every Vision call avoided saves a billed round-trip.
+_OCR_CACHE_PATH = BASE_DIR / ".cache" / "ocr_cache.sqlite3"
+_OCR_CACHE_TTL = 30 * 24 * 3600  # seconds
+_OCR_CACHE_LOCK = threading.Lock()
+_OCR_CACHE_CONN: Optional[sqlite3.Connection] = None
+
+
+def _get_ocr_cache() -> Optional[sqlite3.Connection]:
+    global _OCR_CACHE_CONN
+    with _OCR_CACHE_LOCK:
+        if _OCR_CACHE_CONN is None:
+            try:
+                _OCR_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(
+                    str(_OCR_CACHE_PATH), check_same_thread=False
+                )
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS ocr_cache ("
+                    "sha256 TEXT PRIMARY KEY, text TEXT, created_at INTEGER)"
+                )
+                # Reads skip expired rows but never remove them; purging
+                # once per connection keeps the file from growing forever.
+                conn.execute(
+                    "DELETE FROM ocr_cache WHERE created_at < ?",
+                    (int(time.time()) - _OCR_CACHE_TTL,),
+                )
+                conn.commit()
+                _OCR_CACHE_CONN = conn
+            except sqlite3.Error:  # unwritable dir, corrupt file, ...
+                return None
+    return _OCR_CACHE_CONN
+
+
+# Process-local layer in front of the sqlite cache: a forwarded receipt that
+# reappears within one run skips even the sqlite round-trip.
+_OCR_MEM_CACHE: Dict[str, str] = {}
+_OCR_MEM_CACHE_MAX = 128
+
+
+def _ocr_cache_get(sha256_hex: str) -> Optional[str]:
+    cached = _OCR_MEM_CACHE.get(sha256_hex)
+    if cached is not None:
+        return cached
+    conn = _get_ocr_cache()
+    if conn is None:
+        return None
+    try:
+        with _OCR_CACHE_LOCK:
+            row = conn.execute(
+                "SELECT text, created_at FROM ocr_cache WHERE sha256 = ?",
+                (sha256_hex,),
+            ).fetchone()
+    except sqlite3.Error:
+        return None
+    if row is None or time.time() - row[1] > _OCR_CACHE_TTL:
+        return None
+    _ocr_mem_cache_store(sha256_hex, row[0])
+    return row[0]
+
+
+def _ocr_mem_cache_store(sha256_hex: str, text: str) -> None:
+    with _OCR_CACHE_LOCK:
+        if len(_OCR_MEM_CACHE) >= _OCR_MEM_CACHE_MAX:
+            _OCR_MEM_CACHE.pop(next(iter(_OCR_MEM_CACHE)))
+        _OCR_MEM_CACHE[sha256_hex] = text
+
+
+def _ocr_cache_put(sha256_hex: str, text: str) -> None:
+    _ocr_mem_cache_store(sha256_hex, text)
+    conn = _get_ocr_cache()
+    if conn is None:
+        return
+    try:
+        with _OCR_CACHE_LOCK:
+            conn.execute(
+                "INSERT OR REPLACE INTO ocr_cache (sha256, text, created_at) "
+                "VALUES (?, ?, ?)",
+                (sha256_hex, text, int(time.time())),
+            )
+            conn.commit()
+    except sqlite3.Error:
+        pass  # a failed cache write must never fail the OCR call
+
+
+def _decode_json_response(resp) -> Dict[str, Any]:
+    """Decode an HTTP JSON body with orjson when available."""
+    if orjson is not None:
+        return orjson.loads(resp.content)
+    return resp.json()
+
+# Amount pattern is hit once per OCR'd receipt; compile it once at import.
+# Currency-prefixed and bare thousand-grouped numbers share one alternation
+# so the blob is only scanned once.
+_RE_AMOUNTS = _compile_pattern(
+    r"(?:IDR|Rp)[^\d]*(?P<cur>[0-9.,]+)|(?P<gen>\b\d{1,3}(?:[.,]\d{3})+\b)",
+    re.IGNORECASE,
+)
+# A single receipt never lists more amounts than this; stopping the scan
+# early keeps pathological OCR dumps (tables, statements) from flooding
+# the candidate list.
+_MAX_AMOUNTS_PER_TEXT = 20
+_NO_SEP = str.maketrans("", "", ".,")
+_NL_TO_SPACE = str.maketrans("\n\r\t", "   ")
+
+# Gmail allows at most 100 sub-requests per batch HTTP request, but
+# Google recommends staying at 50 to avoid per-user rate-limit spikes.
+_GMAIL_BATCH_LIMIT = 50
+
+
+def _batch_get_messages_metadata(
+    service, message_ids: List[str], metadata_headers: List[str]
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Fetch metadata for many messages using Gmail batch HTTP requests.
+
+    Instead of one HTTPS round-trip per message (N+1 pattern), all
+    `messages().get()` calls are packed into batch requests of up to
+    100 sub-requests each.
+
+    Returns:
+        Dict mapping message id -> response dict. Messages that failed
+        inside the batch are skipped.
+    """
+    responses: Dict[str, Dict[str, Any]] = {}
+
+    def _collect(request_id, response, exception):
+        if exception is None:
+            responses[request_id] = response
+
+    def _get_one(msg_id: str):
+        return (
+            service.users()
+            .messages()
+            .get(
+                userId="me",
+                id=msg_id,
+                format="metadata",
+                metadataHeaders=metadata_headers,
+                fields="id,internalDate,snippet,payload/headers",
+            )
+        )
+
+    for start in range(0, len(message_ids), _GMAIL_BATCH_LIMIT):
+        chunk = message_ids[start : start + _GMAIL_BATCH_LIMIT]
+        batch = service.new_batch_http_request(callback=_collect)
+        for msg_id in chunk:
+            batch.add(_get_one(msg_id), request_id=msg_id)
+        try:
+            batch.execute(http=_get_thread_http())
+        except Exception:
+            # Batch endpoint unavailable / failed wholesale: fall back to
+            # per-message gets, but overlap the HTTPS round-trips.
+            def _fetch(msg_id: str):
+                try:
+                    return msg_id, _get_one(msg_id).execute(
+                        http=_get_thread_http()
+                    )
+                except HttpError:
+                    return msg_id, None
+
+            with ThreadPoolExecutor(max_workers=16) as executor:
+                for msg_id, resp in executor.map(_fetch, chunk):
+                    if resp is not None:
+                        responses[msg_id] = resp
+
+    return responses
+
+
+def _extract_three_headers(payload_headers) -> tuple:
+    """
+    Pull Subject / From / Date out of a Gmail headers list in one pass.
+
+    Avoids building a full headers dict when only three values are read.
+    """
+    subject = from_ = date_ = ""
+    for h in payload_headers:
+        name = h.get("name")
+        if name == "Subject":
+            subject = h.get("value", "")
+        elif name == "From":
+            from_ = h.get("value", "")
+        elif name == "Date":
+            date_ = h.get("value", "")
+    return subject, from_, date_
+
+
+# Vision accepts up to 16 images per images:annotate request.
+_VISION_BATCH_LIMIT = 16
+
+
+# Phone photos of receipts are often 3-4000 px; OCR accuracy on printed
+# text saturates well below that, and upload time dominates Vision latency.
+_OCR_MAX_DIMENSION = 1600
+
+
+def _prepare_image_for_ocr(image_bytes: bytes) -> bytes:
+    """
+    Downscale and recompress an oversized receipt image before upload.
+
+    Images whose longest side is within _OCR_MAX_DIMENSION pass through
+    untouched, as does everything when Pillow is not installed or the
+    bytes are not a decodable image.
+    """
+    try:
+        from PIL import Image
+    except ImportError:  # pragma: no cover
+        return image_bytes
 
-def _call_vision_ocr(image_bytes: bytes) -> str:
+    try:
+        img = Image.open(BytesIO(image_bytes))
+        w, h = img.size
+        if max(w, h) <= _OCR_MAX_DIMENSION:
+            return image_bytes
+        scale = _OCR_MAX_DIMENSION / max(w, h)
+        img = img.resize(
+            (max(1, int(w * scale)), max(1, int(h * scale))),
+            Image.Resampling.LANCZOS,
+        )
+        # Text detection does not need color; a grayscale JPEG uploads at
+        # roughly a third of the bytes of the RGB version.
+        if img.mode != "L":
+            img = img.convert("L")
+        out = BytesIO()
+        img.save(out, format="JPEG", quality=85, optimize=True)
+        return out.getvalue()
+    except Exception:
+        # Corrupt or exotic image: let Vision decide what to do with it.
+        return image_bytes
+
+
+def _call_vision_ocr_batch(images: List[bytes]) -> List[Dict[str, Any]]:
     """
-    Call Google Cloud Vision OCR and return the full text result.
+    OCR many images, packing up to 16 per Vision images:annotate call.
+
+    All receipts of one email usually fit in a single POST instead of
+    one HTTPS round-trip per image.
 
-    API key is read from tools/gmail_tool/vision_api_key.txt.
+    Returns:
+        One entry per input image: {"text": "..."} on success (empty
+        string when Vision found no text) or {"error": "..."} when
+        Vision reported a per-image error.
     """
     api_key = _get_vision_api_key()
     if not api_key:
@@ -78,31 +468,187 @@ def _call_vision_ocr(image_bytes: bytes) -> str:
             "vision_api_key.txt not found or empty. Please put your Cloud Vision API key in that file."
         )
 
-    img_b64 = b64encode(image_bytes).decode("utf-8")
-
-    payload = {
-        "requests": [
-            {
-                "image": {"content": img_b64},
-                "features": [{"type": "TEXT_DETECTION"}],
-            }
-        ]
+    # The fields mask strips bounding boxes and per-word confidences we
+    # never read; dense receipts shrink from hundreds of KB to a few.
+    params = {
+        "key": api_key,
+        "fields": "responses(fullTextAnnotation/text,error)",
     }
+    # Content-addressed cache first: re-analyzed emails carry the exact
+    # same receipt bytes, and a hash lookup is ~1 ms vs a billed POST.
+    hashes = [hashlib.sha256(img).hexdigest() for img in images]
+    results: List[Optional[Dict[str, Any]]] = [None] * len(images)
+    misses: List[int] = []
+    for i, h in enumerate(hashes):
+        cached = _ocr_cache_get(h)
+        if cached is not None:
+            results[i] = {"text": cached}
+        else:
+            misses.append(i)
+
+    prepared = {i: _prepare_image_for_ocr(images[i]) for i in misses}
+    fresh: List[Dict[str, Any]] = []
+
+    for start in range(0, len(misses), _VISION_BATCH_LIMIT):
+        chunk = [prepared[i] for i in misses[start : start + _VISION_BATCH_LIMIT]]
+        payload = {
+            "requests": [
+                {
+                    "image": {"content": b64encode(img).decode("ascii")},
+                    "features": [{"type": "TEXT_DETECTION"}],
+                }
+                for img in chunk
+            ]
+        }
+
+        if orjson is not None:
+            # Payloads are megabytes of base64; orjson encodes them several
+            # times faster than the stdlib encoder requests would use.
+            resp = _get_vision_session().post(
+                VISION_ENDPOINT,
+                params=params,
+                data=orjson.dumps(payload),
+                headers={"Content-Type": "application/json"},
+                timeout=30,
+            )
+        else:
+            resp = _get_vision_session().post(
+                VISION_ENDPOINT, params=params, json=payload, timeout=30
+            )
+        resp.raise_for_status()
+        data = _decode_json_response(resp)
+
+        responses = data.get("responses", [])
+        for i in range(len(chunk)):
+            r = responses[i] if i < len(responses) else {}
+            err = r.get("error")
+            if err:
+                fresh.append({"error": err.get("message", "Vision API error")})
+                continue
+            annotations = r.get("fullTextAnnotation") or {}
+            fresh.append({"text": annotations.get("text", "")})
 
-    params = {"key": api_key}
-    resp = requests.post(VISION_ENDPOINT, params=params, json=payload, timeout=30)
-    resp.raise_for_status()
-    data = resp.json()
+    for i, result in zip(misses, fresh):
+        results[i] = result
+        if "text" in result:
+            _ocr_cache_put(hashes[i], result["text"])
+
+    return results
 
+
+# files:annotate accepts at most 5 files per request.
+_VISION_FILES_BATCH_LIMIT = 5
+
+
+def _extract_pdf_text_layer(pdf_bytes: bytes) -> str:
+    """
+    Pull the embedded text layer out of a digital PDF; "" when the PDF
+    is scanned (image-only), corrupt, or no backend is installed.
+    """
     try:
-        annotations = data["responses"][0].get("fullTextAnnotation")
-        if not annotations:
+        import fitz
+    except ImportError:  # pragma: no cover
+        fitz = None
+
+    if fitz is not None:
+        try:
+            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+            try:
+                return "\n".join(page.get_text("text") for page in doc)
+            finally:
+                doc.close()
+        except Exception:
             return ""
-        return annotations.get("text", "")
-    except (KeyError, IndexError):
+
+    try:
+        from PyPDF2 import PdfReader
+
+        reader = PdfReader(BytesIO(pdf_bytes))
+        return "\n".join(page.extract_text() or "" for page in reader.pages)
+    except Exception:
         return ""
 
 
+def _call_vision_ocr_pdf_batch(pdfs: List[bytes]) -> List[Dict[str, Any]]:
+    """
+    Extract text from PDF receipts, OCR-ing only the ones that need it.
+
+    Digital receipts (e-wallet exports and the like) carry a text layer
+    that is read locally for free; only image-only PDFs go to Vision
+    files:annotate, up to 5 per call, with per-page fullTextAnnotation
+    texts concatenated. Same result shape as _call_vision_ocr_batch:
+    {"text": ...} or {"error": ...} per input.
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(pdfs)
+    pending: List[int] = []
+    for i, pdf in enumerate(pdfs):
+        text = _extract_pdf_text_layer(pdf)
+        if text.strip():
+            results[i] = {"text": text}
+        else:
+            pending.append(i)
+
+    if not pending:
+        return results
+
+    api_key = _get_vision_api_key()
+    if not api_key:
+        raise RuntimeError(
+            "vision_api_key.txt not found or empty. Please put your Cloud Vision API key in that file."
+        )
+
+    params = {
+        "key": api_key,
+        "fields": "responses(responses(fullTextAnnotation/text),error)",
+    }
+
+    for start in range(0, len(pending), _VISION_FILES_BATCH_LIMIT):
+        chunk_idx = pending[start : start + _VISION_FILES_BATCH_LIMIT]
+        chunk = [pdfs[i] for i in chunk_idx]
+        payload = {
+            "requests": [
+                {
+                    "inputConfig": {
+                        "content": b64encode(pdf).decode("ascii"),
+                        "mimeType": "application/pdf",
+                    },
+                    "features": [{"type": "DOCUMENT_TEXT_DETECTION"}],
+                }
+                for pdf in chunk
+            ]
+        }
+
+        if orjson is not None:
+            resp = _get_vision_session().post(
+                VISION_FILES_ENDPOINT,
+                params=params,
+                data=orjson.dumps(payload),
+                headers={"Content-Type": "application/json"},
+                timeout=60,
+            )
+        else:
+            resp = _get_vision_session().post(
+                VISION_FILES_ENDPOINT, params=params, json=payload, timeout=60
+            )
+        resp.raise_for_status()
+        data = _decode_json_response(resp)
+
+        file_responses = data.get("responses", [])
+        for pos, i in enumerate(chunk_idx):
+            r = file_responses[pos] if pos < len(file_responses) else {}
+            err = r.get("error")
+            if err:
+                results[i] = {"error": err.get("message", "Vision API error")}
+                continue
+            page_texts = [
+                (page.get("fullTextAnnotation") or {}).get("text", "")
+                for page in r.get("responses", [])
+            ]
+            results[i] = {"text": "\n".join(t for t in page_texts if t)}
+
+    return results
+
+
 def _parse_amounts_from_text(text: str) -> List[int]:
     """
     Extract candidate Rupiah amounts from OCR text.
@@ -118,60 +664,47 @@ def _parse_amounts_from_text(text: str) -> List[int]:
     if not text:
         return []
 
-    cleaned = text.replace("\n", " ")
+    cleaned = text.translate(_NL_TO_SPACE)
 
-    pattern_currency = re.compile(r"(?:IDR|Rp)[^\d]*([0-9\.,]+)", re.IGNORECASE)
     amounts: List[int] = []
 
     def _to_int(num_str: str) -> int | None:
-        s = num_str.strip().replace(",", ".")
-        if "." in s:
-            parts = s.split(".")
-            # if the last part has 2 digits it is likely decimals (e.g. 300.000,00)
-            if len(parts[-1]) == 2:
-                s = "".join(parts[:-1])
-            else:
-                s = "".join(parts)
-        s = s.replace(".", "")
+        s = num_str.strip()
+        # a 2-digit tail after a separator is likely decimals (e.g. 300.000,00)
+        if len(s) >= 3 and s[-3] in ".," and s[-2:].isdigit():
+            s = s[:-3]
         try:
-            return int(s)
+            return int(s.translate(_NO_SEP))
         except ValueError:
             return None
 
-    for m in pattern_currency.findall(cleaned):
-        val = _to_int(m)
-        if val is not None:
-            amounts.append(val)
-
-    if not amounts:
-        pattern_generic = re.compile(r"\b(\d{1,3}(?:[.,]\d{3})+)\b")
-        for m in pattern_generic.findall(cleaned):
-            m_clean = m.replace(".", "").replace(",", "")
+    # One alternation pass over the blob instead of a currency scan followed
+    # by a generic rescan; currency-prefixed hits still win when present.
+    generic: List[int] = []
+    for m in _RE_AMOUNTS.finditer(cleaned):
+        cur = m.group("cur")
+        if cur is not None:
+            val = _to_int(cur)
+            if val is not None:
+                amounts.append(val)
+                if len(amounts) >= _MAX_AMOUNTS_PER_TEXT:
+                    break
+        elif len(generic) < _MAX_AMOUNTS_PER_TEXT:
             try:
-                amounts.append(int(m_clean))
+                generic.append(int(m.group("gen").translate(_NO_SEP)))
             except ValueError:
                 continue
 
-    # unique + sorted
-    return sorted(set(amounts))
-
-
-def _extract_text_body(payload) -> str:
-    """Extract the email body (text/plain) from Gmail multipart payload."""
-    if not payload:
-        return ""
-    mime = payload.get("mimeType", "")
-    body = payload.get("body", {})
+    if not amounts:
+        amounts = generic
 
-    if mime == "text/plain" and "data" in body:
-        data = body["data"]
-        return urlsafe_b64decode(data + "==").decode("utf-8", errors="ignore")
+    if len(amounts) == 1:
+        return amounts
 
-    for part in payload.get("parts", []):
-        txt = _extract_text_body(part)
-        if txt:
-            return txt
-    return ""
+    # unique + sorted; dict.fromkeys dedups without the set->list copy
+    out = list(dict.fromkeys(amounts))
+    out.sort()
+    return out
 
 
 def _download_attachment_bytes(service, message_id: str, attachment_id: str) -> bytes:
@@ -181,23 +714,94 @@ def _download_attachment_bytes(service, message_id: str, attachment_id: str) ->
         .messages()
         .attachments()
         .get(userId="me", messageId=message_id, id=attachment_id)
-        .execute()
+        .execute(http=_get_thread_http())
     )
     data = att.get("data", "")
-    return urlsafe_b64decode(data.encode("utf-8"))
+    # urlsafe_b64decode accepts the ASCII str directly; encoding it first
+    # would allocate an extra buffer the size of the payload.
+    return urlsafe_b64decode(data)
+
+
+def _download_attachments_batch(
+    service, message_id: str, attachment_ids: List[str]
+) -> List[Any]:
+    """
+    Download many attachments of one message via Gmail batch HTTP requests.
+
+    One batch POST replaces one HTTPS round-trip per attachment. Returns
+    one entry per input id, in order: the decoded bytes on success or the
+    HttpError that sub-request raised. Falls back to threaded per-
+    attachment gets when the batch endpoint itself fails.
+    """
+    results: List[Any] = [None] * len(attachment_ids)
+
+    def _collect(request_id, response, exception):
+        idx = int(request_id)
+        if exception is not None:
+            results[idx] = exception
+        else:
+            results[idx] = urlsafe_b64decode(response.get("data", ""))
+
+    def _get_one(attachment_id: str):
+        return (
+            service.users()
+            .messages()
+            .attachments()
+            .get(userId="me", messageId=message_id, id=attachment_id)
+        )
+
+    for start in range(0, len(attachment_ids), _GMAIL_BATCH_LIMIT):
+        chunk = attachment_ids[start : start + _GMAIL_BATCH_LIMIT]
+        batch = service.new_batch_http_request(callback=_collect)
+        for offset, attachment_id in enumerate(chunk):
+            batch.add(_get_one(attachment_id), request_id=str(start + offset))
+        try:
+            batch.execute(http=_get_thread_http())
+        except Exception:
+
+            def _fetch(idx_aid):
+                idx, attachment_id = idx_aid
+                try:
+                    return idx, _download_attachment_bytes(
+                        service, message_id, attachment_id
+                    )
+                except HttpError as e:
+                    return idx, e
+
+            with ThreadPoolExecutor(max_workers=min(8, len(chunk))) as ex:
+                for idx, res in ex.map(
+                    _fetch, enumerate(chunk, start=start)
+                ):
+                    results[idx] = res
+
+    return results
+
+
+# Hoisted so the per-attachment loop below doesn't rebuild the literal
+# tuples on every iteration; same pattern as the form/receipt name hints.
+_IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+_RECEIPT_PDF_NAME_HINTS = ("receipt", "kwitansi", "bukti", "struk")
 
 
 def _get_receipt_image_attachments(attachments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
-    Filter all attachments that look like payment receipts (images).
+    Filter all attachments that look like payment receipts.
 
-    Version 1: mimeType image/* or filename ends with .jpg/.jpeg/.png
+    Version 1: mimeType image/* or filename ends with .jpg/.jpeg/.png.
+    Scanned-PDF receipts are accepted too when the filename clearly says
+    receipt; other PDFs are left alone. A filename can match both the
+    form and receipt hints, so callers that also pick a form PDF must
+    exclude it from this list themselves (analyze_reimburse_email does).
     """
     receipt_atts: List[Dict[str, Any]] = []
     for att in attachments:
         mime = (att.get("mimeType") or "").lower()
         filename = (att.get("filename") or "").lower()
-        if mime.startswith("image/") or filename.endswith((".jpg", ".jpeg", ".png")):
+        if mime.startswith("image/") or filename.endswith(_IMAGE_EXTS):
+            receipt_atts.append(att)
+        elif (mime == "application/pdf" or filename.endswith(".pdf")) and any(
+            kw in filename for kw in _RECEIPT_PDF_NAME_HINTS
+        ):
             receipt_atts.append(att)
     return receipt_atts
 
@@ -229,38 +833,38 @@ def _reconcile_form_and_receipts(form_data: Dict[str, Any], receipts: List[Dict[
       ]
     """
     items: List[Dict[str, Any]] = form_data.get("items", [])
-    # use only receipts with a valid selected_amount
-    usable_receipts = [
-        {"idx": i, "amount": r.get("selected_amount"), "filename": r.get("filename")}
-        for i, r in enumerate(receipts)
-        if isinstance(r.get("selected_amount"), int)
-    ]
 
-    used_flags = {r["idx"]: False for r in usable_receipts}
+    # Index usable receipts by amount once; each item match then pops in
+    # O(1) instead of rescanning the receipt list per item. Receipts with
+    # the same amount are consumed in original order.
+    by_amount: Dict[int, deque] = defaultdict(deque)
+    usable_indices: List[int] = []
+    for i, r in enumerate(receipts):
+        amount = r.get("selected_amount")
+        if isinstance(amount, int):
+            by_amount[amount].append(i)
+            usable_indices.append(i)
+
+    matched_indices: set = set()
     per_item_results: List[Dict[str, Any]] = []
 
     for item in items:
         target = item.get("subtotal")
         matched_idx = None
-        matched_filename = None
 
         if isinstance(target, int):
-            for r in usable_receipts:
-                if used_flags[r["idx"]]:
-                    continue
-                if r["amount"] == target:
-                    matched_idx = r["idx"]
-                    matched_filename = r["filename"]
-                    break
+            candidates = by_amount.get(target)
+            if candidates:
+                matched_idx = candidates.popleft()
 
         if matched_idx is not None:
-            used_flags[matched_idx] = True
+            matched_indices.add(matched_idx)
             per_item_results.append(
                 {
                     "description": item.get("description") or item.get("deskripsi"),
                     "subtotal": target,
                     "status": "MATCH",
-                    "receipt_filename": matched_filename,
+                    "receipt_filename": receipts[matched_idx].get("filename"),
                 }
             )
         else:
@@ -275,9 +879,7 @@ def _reconcile_form_and_receipts(form_data: Dict[str, Any], receipts: List[Dict[
 
     # all receipts that were not used
     unmatched_receipts = [
-        receipts[idx]
-        for idx, used in used_flags.items()
-        if not used
+        receipts[idx] for idx in usable_indices if idx not in matched_indices
     ]
 
     form_total = form_data.get("total")
@@ -311,54 +913,11 @@ def _reconcile_form_and_receipts(form_data: Dict[str, Any], receipts: List[Dict[
         "notes": notes,
     }
 
-    # --- unreachable legacy code below (kept as-is, never executed) ---
-    items = form["items"]
-    receipts_list = receipts["receipts"]
 
-    # mark receipts that are already used
-    used = [False] * len(receipts_list)
-    hasil_items = []
-
-    for item in items:
-        target = item["subtotal"]
-        match_idx = None
+# Filename keywords used to tell the Pituku form apart from receipts.
+_FORM_NAME_HINTS = ("reimburse", "reimbursement", "form", "persetujuan", "approval")
+_RECEIPT_NAME_HINTS = ("receipt", "bukti", "invoice", "struk")
 
-        for i, rc in enumerate(receipts_list):
-            if used[i]:
-                continue
-            if rc.get("selected_amount") == target:
-                match_idx = i
-                break
-
-        if match_idx is not None:
-            used[match_idx] = True
-            hasil_items.append(
-                {
-                    "description": item["description"],
-                    "subtotal": target,
-                    "receipt_filename": receipts_list[match_idx]["filename"],
-                    "status": "MATCH",
-                }
-            )
-        else:
-            hasil_items.append(
-                {
-                    "description": item["description"],
-                    "subtotal": target,
-                    "receipt_filename": None,
-                    "status": "MISSING_RECEIPT",
-                }
-            )
-
-    # receipts that remain unused
-    unmatched_receipts = [
-        rc for i, rc in enumerate(receipts_list) if not used[i]
-    ]
-
-    return {
-        "items": hasil_items,
-        "unmatched_receipts": unmatched_receipts,
-    }
 
 def _select_form_pdf_attachment(attachments: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
     """
@@ -370,32 +929,106 @@ def _select_form_pdf_attachment(attachments: List[Dict[str, Any]]) -> Optional[D
     - Prefer filenames containing words like 'reimburse', 'form', 'persetujuan', 'approval'.
     - Penalize filenames that look like receipts/invoices (receipt, bukti, invoice, struk).
     """
-    pdf_atts: List[Dict[str, Any]] = []
+    # (lowered filename, attachment): lowercase once per attachment and
+    # reuse it for scoring instead of re-lowering inside the sort key.
+    pdf_atts: List[tuple] = []
     for att in attachments:
         mime = (att.get("mimeType") or "").lower()
         filename = (att.get("filename") or "").lower()
         if "pdf" in mime or filename.endswith(".pdf"):
-            pdf_atts.append(att)
+            pdf_atts.append((filename, att))
 
     if not pdf_atts:
         return None
 
-    def score(att: Dict[str, Any]) -> int:
-        name = (att.get("filename") or "").lower()
+    def score(entry: tuple) -> int:
+        name = entry[0]
         s = 0
 
         # Positive signals → likely the PITUKU form
-        if any(k in name for k in ["reimburse", "reimbursement", "form", "persetujuan", "approval"]):
+        if any(k in name for k in _FORM_NAME_HINTS):
             s += 10
 
         # Negative signals → likely a receipt/invoice instead of the form
-        if any(k in name for k in ["receipt", "bukti", "invoice", "struk"]):
+        if any(k in name for k in _RECEIPT_NAME_HINTS):
             s -= 5
 
         return s
 
-    pdf_atts.sort(key=score, reverse=True)
-    return pdf_atts[0]
+    # Only the winner matters, so a linear max beats sorting the list;
+    # ties keep the first attachment, same as the stable sort did.
+    return max(pdf_atts, key=score)[1]
+
+
+def _find_form_pdf_attachment(payload) -> Optional[Dict[str, Any]]:
+    """
+    Walk the payload once and pick the reimbursement form PDF.
+
+    Only PDF parts are collected during the traversal (no records are
+    built for images or inline parts), then the usual form-vs-receipt
+    scoring picks the winner.
+    """
+    pdf_atts: List[Dict[str, Any]] = []
+    # Explicit stack with reversed children = the recursive preorder the
+    # original walker produced, so tie-broken scoring picks the same PDF.
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        if not part:
+            continue
+
+        filename = part.get("filename")
+        body = part.get("body", {})
+
+        if filename and body.get("attachmentId"):
+            mime = (part.get("mimeType") or "").lower()
+            if "pdf" in mime or filename.lower().endswith(".pdf"):
+                pdf_atts.append(
+                    {
+                        "attachment_id": body["attachmentId"],
+                        "filename": filename,
+                        "mimeType": part.get("mimeType"),
+                    }
+                )
+
+        stack.extend(reversed(part.get("parts", [])))
+
+    if not pdf_atts:
+        return None
+    return _select_form_pdf_attachment(pdf_atts)
+
+
+# Prefixes of the form lines the parser cares about; str.startswith with
+# a tuple rejects all other lines in a single C-level call.
+_FORM_LINE_PREFIXES = (
+    "Tanggal Pengajuan",
+    "Nama Bank",
+    "Nomor Rekening",
+    "Nama Rekening",
+    "No Description",
+)
+
+# Pituku forms are 1-3 pages; anything beyond that is scanned appendix
+# material (stamps, signatures, photos) the field parser never reads.
+_MAX_FORM_PAGES = 3
+
+# One multiline pass extracts all header fields from the joined PDF text.
+_RE_HEADERS = re.compile(
+    r"^[ \t]*(Tanggal Pengajuan|Nama Bank|Nomor Rekening|Nama Rekening)"
+    r"\s*:[ \t]*(.+?)[ \t]*$",
+    re.MULTILINE,
+)
+
+# Precompiled patterns for the Pituku form detail row
+_RE_DESC = re.compile(r"1\s+(.*?)\s+Rp")
+_RE_NUMS = _compile_pattern(r"(\d{1,3}(?:\.\d{3})+)")
+_RE_JUMLAH = re.compile(r"\s(\d+)\s+Rp")
+
+
+def _dotted_to_int(s: str) -> int:
+    """Convert a dotted thousands number like '1.250.000' to int."""
+    return int(s.replace(".", ""))
+
 
 def _parse_reimburse_form_pdf(pdf_bytes: bytes) -> Dict[str, Any]:
     """
@@ -407,105 +1040,383 @@ def _parse_reimburse_form_pdf(pdf_bytes: bytes) -> Dict[str, Any]:
       - DETAIL PENGAJUAN
       - Nama Bank, Nomor Rekening, Nama Rekening
     """
-    reader = PdfReader(BytesIO(pdf_bytes))
-    text_parts = []
-    for page in reader.pages:
-        t = page.extract_text() or ""
-        text_parts.append(t)
-    full_text = "\n".join(text_parts)
+    # PDF backends are imported lazily: listing tools never parse PDFs
+    # and shouldn't pay the import cost at module load.
+    try:
+        import fitz  # PyMuPDF — much faster text extraction (C core)
+    except ImportError:  # pragma: no cover
+        fitz = None
+
+    def _has_all_anchors(text: str) -> bool:
+        return all(a in text for a in _FORM_LINE_PREFIXES)
 
-    # Normalize into a list of non-empty lines
-    lines = [ln.strip() for ln in full_text.splitlines() if ln.strip()]
+    buf = io.StringIO()
+    if fitz is not None:
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        try:
+            # The form fields almost always sit on page 1; extract that
+            # first and skip the rest of the document when everything the
+            # parser needs is already present.
+            first = doc.load_page(0).get_text("text")
+            buf.write(first)
+            buf.write("\n")
+            page_count = min(len(doc), _MAX_FORM_PAGES)
+            if not _has_all_anchors(first) and page_count > 1:
+                for i in range(1, page_count):
+                    buf.write(doc.load_page(i).get_text("text"))
+                    buf.write("\n")
+                    if _has_all_anchors(buf.getvalue()):
+                        break
+        finally:
+            doc.close()
+    else:
+        # Fallback: PyPDF2 (pure Python, much slower)
+        from PyPDF2 import PdfReader
+
+        reader = PdfReader(BytesIO(pdf_bytes))
+        for page in reader.pages[:_MAX_FORM_PAGES]:
+            buf.write(page.extract_text() or "")
+            buf.write("\n")
+            if _has_all_anchors(buf.getvalue()):
+                break
+    full_text = buf.getvalue()
 
-    # Tanggal Pengajuan
+    # One C-level regex scan over the joined text replaces the per-line
+    # startswith loop. e.g. "Tanggal Pengajuan : 16/04/2025"
     tanggal = ""
-    for ln in lines:
-        if ln.startswith("Tanggal Pengajuan"):
-            # e.g. "Tanggal Pengajuan : 16/04/2025"
-            parts = ln.split(":", 1)
-            if len(parts) == 2:
-                tanggal = parts[1].strip()
-            break
+    nama_bank = nomor_rek = nama_rek = ""
+
+    for key, val in _RE_HEADERS.findall(full_text):
+        if key == "Tanggal Pengajuan":
+            if not tanggal:
+                tanggal = val
+        elif key == "Nama Bank":
+            nama_bank = val
+        elif key == "Nomor Rekening":
+            nomor_rek = val
+        elif key == "Nama Rekening":
+            nama_rek = val
+
+    # Detail pengajuan row
+    # Found the row containing "No Description Detail Harga Jumlah Sub Total"
+    item_description = ""
+    harga = jumlah = subtotal = None
+
+    marker = full_text.find("No Description")
+    if marker != -1:
+        # join the 3 non-empty lines after the header row; relatively
+        # safe for the sample
+        after = full_text[marker:].splitlines()[1:]
+        row_text = " ".join(
+            [ln.strip() for ln in after if ln.strip()][:3]
+        )
+        # Description: drop leading "1 " and anything after "Rp"
+        m_desc = _RE_DESC.search(row_text)
+        if m_desc:
+            item_description = m_desc.group(1).strip()
+
+        # Numbers: capture patterns like 300.000, 1.250.000, etc.
+        nums = _RE_NUMS.findall(row_text)
+
+        if nums:
+            harga = _dotted_to_int(nums[0])
+            subtotal = _dotted_to_int(nums[-1])
+        # Find quantity (usually 1,2,...) between price & subtotal
+        m_jumlah = _RE_JUMLAH.search(row_text)
+        if m_jumlah:
+            jumlah = int(m_jumlah.group(1))
+
+    return {
+        "tanggal_pengajuan": tanggal,
+        "items": [
+            {
+                "description": item_description,
+                "harga": harga,
+                "jumlah": jumlah,
+                "subtotal": subtotal,
+            }
+        ],
+        "total": subtotal,
+        "rekening": {
+            "bank": nama_bank,
+            "nomor_rekening": nomor_rek,
+            "nama_rekening": nama_rek,
+        },
+    }
+
+
+def _process_receipt_attachments(
+    service,
+    message_id: str,
+    receipt_atts: List[Dict[str, Any]],
+    download_results: Optional[List[Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Download all receipt attachments, OCR them in batched Vision calls,
+    and parse payment amounts from each result.
+
+    Results keep the order of `receipt_atts`. Per-receipt download or
+    OCR failures become error dicts in the corresponding slot, matching
+    the shape the tools always returned. Callers that already fetched
+    the bytes (e.g. in a batch shared with the form PDF) pass them via
+    `download_results`.
+    """
+    receipts_result: List[Optional[Dict[str, Any]]] = []
+    downloaded: List[Optional[bytes]] = []
+
+    if download_results is None:
+        # One batch HTTP request fetches every receipt of the email at once.
+        download_results = _download_attachments_batch(
+            service, message_id, [att["attachment_id"] for att in receipt_atts]
+        )
+
+    for att, res in zip(receipt_atts, download_results):
+        if not isinstance(res, bytes):
+            err = res
+            downloaded.append(None)
+            receipts_result.append(
+                {
+                    "filename": att.get("filename"),
+                    "error": "Failed to download attachment.",
+                    "status": getattr(getattr(err, "resp", None), "status", None),
+                    "reason": err._get_reason()
+                    if isinstance(err, HttpError)
+                    else str(err),
+                }
+            )
+            continue
+        downloaded.append(res)
+        receipts_result.append(None)  # filled in after OCR
+
+    # Scanned-PDF receipts go to files:annotate, images to images:annotate.
+    pending_img = []
+    pending_pdf = []
+    for i, b in enumerate(downloaded):
+        if b is None:
+            continue
+        filename = (receipt_atts[i].get("filename") or "").lower()
+        mime = (receipt_atts[i].get("mimeType") or "").lower()
+        if mime == "application/pdf" or filename.endswith(".pdf"):
+            pending_pdf.append(i)
+        else:
+            pending_img.append(i)
+
+    for pending, ocr_call in (
+        (pending_img, _call_vision_ocr_batch),
+        (pending_pdf, _call_vision_ocr_pdf_batch),
+    ):
+        if not pending:
+            continue
+        try:
+            ocr_results = ocr_call([downloaded[i] for i in pending])
+        except Exception as e:
+            for i in pending:
+                receipts_result[i] = {
+                    "filename": receipt_atts[i].get("filename"),
+                    "error": f"OCR failed: {e}",
+                }
+        else:
+            for i, ocr in zip(pending, ocr_results):
+                filename = receipt_atts[i].get("filename")
+                if "error" in ocr:
+                    receipts_result[i] = {
+                        "filename": filename,
+                        "error": f"OCR failed: {ocr['error']}",
+                    }
+                    continue
+
+                ocr_text = ocr.get("text", "")
+                amounts = _parse_amounts_from_text(ocr_text)
+                selected = amounts[-1] if amounts else None  # use the largest/last
+                receipts_result[i] = {
+                    "filename": filename,
+                    "candidate_amounts": amounts,
+                    "selected_amount": selected,
+                    "ocr_text_preview": (ocr_text[:300] + "…") if ocr_text else "",
+                }
+
+    return receipts_result
+
+
+# Full-message memo with a short TTL. Gmail messages are immutable, so
+# the TTL is purely a memory bound for long-lived agent processes, not a
+# staleness guard. Thread-safe for the parallel export path.
+_MSG_CACHE: Dict[tuple, tuple] = {}  # key -> (fetched_at, message dict)
+_MSG_CACHE_LOCK = threading.Lock()
+_MSG_CACHE_TTL = 300  # seconds
+_MSG_CACHE_MAX = 256
+
+
+def _msg_cache_lookup(key: tuple) -> Optional[Dict[str, Any]]:
+    with _MSG_CACHE_LOCK:
+        entry = _MSG_CACHE.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[0] > _MSG_CACHE_TTL:
+            del _MSG_CACHE[key]
+            return None
+        return entry[1]
+
+
+def _msg_cache_store(key: tuple, msg: Dict[str, Any]) -> None:
+    with _MSG_CACHE_LOCK:
+        if len(_MSG_CACHE) >= _MSG_CACHE_MAX:
+            # insertion order doubles as rough LRU here; drop the oldest
+            _MSG_CACHE.pop(next(iter(_MSG_CACHE)))
+        _MSG_CACHE[key] = (time.time(), msg)
+
+
+def _get_message_full(message_id: str) -> Dict[str, Any]:
+    """
+    Fetch a message with format="full", memoized per message id.
+
+    Pipelined usage (list -> analyze -> extract on the same id) otherwise
+    re-downloads the identical MIME tree for every tool call. Callers
+    must treat the returned dict as read-only.
+    """
+    key = ("full", message_id)
+    msg = _msg_cache_lookup(key)
+    if msg is None:
+        service = _get_gmail_service()
+        msg = (
+            service.users()
+            .messages()
+            .get(
+                userId="me",
+                id=message_id,
+                format="full",
+                fields="id,snippet,payload",
+            )
+            .execute(http=_get_thread_http())
+        )
+        _msg_cache_store(key, msg)
+    return msg
+
+
+def _get_message_payload(message_id: str) -> Dict[str, Any]:
+    """Like _get_message_full but masked down to the payload only."""
+    key = ("payload", message_id)
+    msg = _msg_cache_lookup(key)
+    if msg is None:
+        service = _get_gmail_service()
+        msg = (
+            service.users()
+            .messages()
+            .get(userId="me", id=message_id, format="full", fields="payload")
+            .execute(http=_get_thread_http())
+        )
+        _msg_cache_store(key, msg)
+    return msg
+
+
+# Parsed forms keyed by PDF content hash, so the same form re-sent under a
+# different message id (resubmissions, forwards) is still parsed only once.
+# The export tool's analysis workers reach this concurrently, hence the lock.
+_FORM_PARSE_CACHE: Dict[bytes, Dict[str, Any]] = {}
+_FORM_PARSE_CACHE_MAX = 256
+_FORM_PARSE_CACHE_LOCK = threading.Lock()
+
+
+def _parse_form_pdf_cached(pdf_bytes: bytes) -> Dict[str, Any]:
+    key = hashlib.md5(pdf_bytes).digest()
+    with _FORM_PARSE_CACHE_LOCK:
+        cached = _FORM_PARSE_CACHE.get(key)
+    if cached is None:
+        # Parse outside the lock; two threads racing on the same bytes
+        # just do the work twice, which beats serializing all parses.
+        parsed = _parse_reimburse_form_pdf(pdf_bytes)
+        with _FORM_PARSE_CACHE_LOCK:
+            cached = _FORM_PARSE_CACHE.get(key)
+            if cached is None:
+                if len(_FORM_PARSE_CACHE) >= _FORM_PARSE_CACHE_MAX:
+                    # dicts iterate in insertion order; drop the oldest entry
+                    _FORM_PARSE_CACHE.pop(next(iter(_FORM_PARSE_CACHE)))
+                cached = _FORM_PARSE_CACHE[key] = parsed
+    return cached
+
+
+@functools.lru_cache(maxsize=256)
+def _download_and_parse_form_pdf(message_id: str, attachment_id: str) -> Dict[str, Any]:
+    """
+    Download and parse a reimbursement form PDF, memoized per
+    (message_id, attachment_id).
+
+    Gmail attachments are immutable, so re-analyzing the same email
+    skips both the attachment download and the PDF parse.
+    """
+    service = _get_gmail_service()
+    pdf_bytes = _download_attachment_bytes(service, message_id, attachment_id)
+    return _parse_form_pdf_cached(pdf_bytes)
+
+
+def _get_parsed_form_pdf(message_id: str, attachment_id: str) -> Dict[str, Any]:
+    """Cached form-PDF parse; returns a copy so callers can mutate freely."""
+    return copy.deepcopy(_download_and_parse_form_pdf(message_id, attachment_id))
+
+
+def _collect_attachments(payload, out_list):
+    """Collect attachments (id, filename, mimeType) from Gmail payload.
+
+    Iterative preorder walk: children are pushed reversed so the stack
+    pops them in document order, matching the old recursive output.
+    """
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        if not part:
+            continue
 
-    # Nama Bank, No Rek, Nama Rek
-    nama_bank = nomor_rek = nama_rek = ""
-    for ln in lines:
-        if ln.startswith("Nama Bank"):
-            nama_bank = ln.split(":", 1)[1].strip()
-        elif ln.startswith("Nomor Rekening"):
-            nomor_rek = ln.split(":", 1)[1].strip()
-        elif ln.startswith("Nama Rekening"):
-            nama_rek = ln.split(":", 1)[1].strip()
+        filename = part.get("filename")
+        body = part.get("body", {})
 
-    # Detail pengajuan row
-    # We search for the row containing "No Description Detail Harga Jumlah Sub Total"
-    item_description = ""
-    harga = jumlah = subtotal = None
+        if filename and body.get("attachmentId"):
+            out_list.append(
+                {
+                    "attachment_id": body["attachmentId"],
+                    "filename": filename,
+                    "mimeType": part.get("mimeType"),
+                }
+            )
 
-    # join 3 lines after "No Description Detail Harga Jumlah Sub Total"
-    for i, ln in enumerate(lines):
-        if ln.startswith("No Description"):
-            row_text = " ".join(lines[i + 1: i + 4])  # relatively safe for the sample
-            # Description: drop leading "1 " and anything after "Rp"
-            m_desc = re.search(r"1\s+(.*?)\s+Rp", row_text)
-            if m_desc:
-                item_description = m_desc.group(1).strip()
-
-            # Numbers: capture patterns like 300.000, 1.250.000, etc.
-            nums = re.findall(r"(\d{1,3}(?:\.\d{3})+)", row_text)
-
-            def to_int(s: str) -> int:
-                return int(s.replace(".", ""))
-
-            if nums:
-                harga = to_int(nums[0])
-                subtotal = to_int(nums[-1])
-            # Find quantity (usually 1,2,...) between price & subtotal
-            m_jumlah = re.search(r"\s(\d+)\s+Rp", row_text)
-            if m_jumlah:
-                jumlah = int(m_jumlah.group(1))
+        stack.extend(reversed(part.get("parts", [])))
 
-            break
 
-    return {
-        "tanggal_pengajuan": tanggal,
-        "items": [
-            {
-                "description": item_description,
-                "harga": harga,
-                "jumlah": jumlah,
-                "subtotal": subtotal,
-            }
-        ],
-        "total": subtotal,
-        "rekening": {
-            "bank": nama_bank,
-            "nomor_rekening": nomor_rek,
-            "nama_rekening": nama_rek,
-        },
-    }
+def _walk_payload(payload) -> tuple:
+    """Extract the text/plain body and the attachment list in one traversal.
 
+    Fuses the body lookup with _collect_attachments for callers that need
+    both, so large multipart trees are only walked once.
+    """
+    body_text = ""
+    attachments = []
+    # Same preorder stack walk as _collect_attachments, so the first
+    # text/plain part in document order wins the body slot.
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        if not part:
+            continue
 
-def _collect_attachments(payload, out_list):
-    """Collect attachments (id, filename, mimeType) from Gmail payload."""
-    if not payload:
-        return
+        body = part.get("body", {})
 
-    filename = payload.get("filename")
-    body = payload.get("body", {})
-    mime = payload.get("mimeType")
+        if not body_text and part.get("mimeType", "") == "text/plain":
+            if "data" in body:
+                data = body["data"]
+                padded = data + "=" * (-len(data) % 4)
+                body_text = urlsafe_b64decode(padded).decode("utf-8", errors="ignore")
 
-    if filename and body.get("attachmentId"):
-        out_list.append(
-            {
-                "attachment_id": body["attachmentId"],
-                "filename": filename,
-                "mimeType": mime,
-            }
-        )
+        filename = part.get("filename")
+        if filename and body.get("attachmentId"):
+            attachments.append(
+                {
+                    "attachment_id": body["attachmentId"],
+                    "filename": filename,
+                    "mimeType": part.get("mimeType"),
+                }
+            )
 
-    for part in payload.get("parts", []):
-        _collect_attachments(part, out_list)
+        stack.extend(reversed(part.get("parts", [])))
+    return body_text, attachments
 
 
 @tool()
@@ -519,22 +1430,35 @@ def export_reimburse_summary_this_week() -> Dict[str, Any]:
         Email ID, Subject, Submission Date, Form Total, Receipt Total, Status, Notes.
     - Return the Excel file as a base64 string.
     """
-    import pandas as pd
+    import xlsxwriter
+
     service = _get_gmail_service()
 
     # 1) This week's range (using existing helper)
     start_date, end_date_exclusive = _get_current_week_range_until_today()
 
-    # Same query style as list_reimburse_emails_this_week
-    query = f"after:{start_date} before:{end_date_exclusive} reimburse"
+    # Same keyword as list_reimburse_emails_this_week, but filtered
+    # server-side: a submission always carries the form PDF, so anything
+    # without a PDF attachment would only produce an ERROR row anyway.
+    query = (
+        f'("reimburse" OR "reimbursement") has:attachment filename:pdf '
+        f"after:{start_date} before:{end_date_exclusive}"
+    )
 
+    # Follow nextPageToken so a heavy week isn't silently truncated at
+    # one page; 500 ids per list() call is the API maximum.
+    messages: List[Dict[str, Any]] = []
     try:
-        resp = (
-            service.users()
-            .messages()
-            .list(userId="me", q=query, maxResults=50)
-            .execute()
+        req = service.users().messages().list(
+            userId="me",
+            q=query,
+            maxResults=500,
+            fields="messages/id,nextPageToken",
         )
+        while req is not None:
+            resp = req.execute(http=_get_thread_http())
+            messages.extend(resp.get("messages", []) or [])
+            req = service.users().messages().list_next(req, resp)
     except HttpError as e:
         return {
             "error": "HttpError while searching reimbursement emails for this week.",
@@ -544,53 +1468,45 @@ def export_reimburse_summary_this_week() -> Dict[str, Any]:
             "end_date_exclusive": end_date_exclusive,
         }
 
-    messages = resp.get("messages", []) or []
-
-    summary_rows: List[Dict[str, Any]] = []
-
-    for m in messages:
-        msg_id = m.get("id")
-        if not msg_id:
-            continue
-
+    def _safe_analyze(msg_id: str) -> Dict[str, Any]:
         try:
             analysis = analyze_reimburse_email(message_id=msg_id)
         except Exception as e:
-            summary_rows.append(
-                {
-                    "Email ID": msg_id,
-                    "Subject": "",
-                    "Tanggal Pengajuan": "",
-                    "Total Form": None,
-                    "Total Bukti Bayar": None,
-                    "Status": "ERROR",
-                    "Catatan": f"Analysis failed: {e}",
-                }
-            )
-            continue
+            return {
+                "Email ID": msg_id,
+                "Subject": "",
+                "Tanggal Pengajuan": "",
+                "Total Form": None,
+                "Total Bukti Bayar": None,
+                "Status": "ERROR",
+                "Catatan": f"Analysis failed: {e}",
+            }
 
         form = analysis.get("form_data", {}) or {}
         recon = analysis.get("reconciliation", {}) or {}
 
-        tanggal_pengajuan = form.get("tanggal_pengajuan", "")
-        total_form = form.get("total")
-        total_receipts = recon.get("sum_receipt_amounts")
-
-        status = recon.get("overall_status", "UNKNOWN")
         notes_list = recon.get("notes", []) or []
-        catatan = "; ".join(notes_list)
 
-        summary_rows.append(
-            {
-                "Email ID": msg_id,
-                "Subject": analysis.get("subject", ""),
-                "Tanggal Pengajuan": tanggal_pengajuan,
-                "Total Form": total_form,
-                "Total Bukti Bayar": total_receipts,
-                "Status": status,
-                "Catatan": catatan,
-            }
-        )
+        return {
+            "Email ID": msg_id,
+            "Subject": analysis.get("subject", ""),
+            "Tanggal Pengajuan": form.get("tanggal_pengajuan", ""),
+            "Total Form": form.get("total"),
+            "Total Bukti Bayar": recon.get("sum_receipt_amounts"),
+            "Status": recon.get("overall_status", "UNKNOWN"),
+            "Catatan": "; ".join(notes_list),
+        }
+
+    msg_ids = [m["id"] for m in messages if m.get("id")]
+
+    # Each analysis is dominated by Gmail GETs, attachment downloads and
+    # the Vision POST; overlapping them hides most of the HTTP latency.
+    # Rows come back in msg_ids order, same as the old serial loop.
+    if len(msg_ids) > 1:
+        with ThreadPoolExecutor(max_workers=min(12, len(msg_ids))) as ex:
+            summary_rows = list(ex.map(_safe_analyze, msg_ids))
+    else:
+        summary_rows = [_safe_analyze(msg_id) for msg_id in msg_ids]
 
     # 2) If there are no emails, still return info
     if not summary_rows:
@@ -604,33 +1520,47 @@ def export_reimburse_summary_this_week() -> Dict[str, Any]:
             "info": "No reimbursement emails found for this week.",
         }
 
-    # 3) Build DataFrame and Excel in memory
-    df = pd.DataFrame(summary_rows)
+    # 3) Write the Excel file straight from the row dicts. xlsxwriter's
+    # constant_memory mode flushes each row as it is written, so peak
+    # memory stays flat however large the week is, and skipping the
+    # DataFrame avoids the pandas import on this path entirely.
+    columns = [
+        "Email ID",
+        "Subject",
+        "Tanggal Pengajuan",
+        "Total Form",
+        "Total Bukti Bayar",
+        "Status",
+        "Catatan",
+    ]
 
+    # No in_memory here: xlsxwriter silently turns constant_memory off
+    # when both are set. Row data streams through temp files and still
+    # assembles into the BytesIO on close().
     buffer = io.BytesIO()
-    with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
-        df.to_excel(writer, sheet_name="Summary", index=False)
-
-        # Basic formatting: bold header, autofilter, simple auto width
-        workbook = writer.book
-        worksheet = writer.sheets["Summary"]
-
-        header_format = workbook.add_format({"bold": True})
-        worksheet.set_row(0, None, header_format)
-
-        # Autofilter entire range
-        worksheet.autofilter(0, 0, len(df), len(df.columns) - 1)
-
-        # Auto column width
-        for col_idx, col_name in enumerate(df.columns):
-            max_len = max(
-                df[col_name].astype(str).map(len).max(),
-                len(col_name),
-            )
-            worksheet.set_column(col_idx, col_idx, max_len + 2)
+    workbook = xlsxwriter.Workbook(buffer, {"constant_memory": True})
+    worksheet = workbook.add_worksheet("Summary")
+    header_format = workbook.add_format({"bold": True})
+
+    # Basic formatting: bold header, autofilter, simple auto width.
+    # Column widths accumulate while writing to avoid a second pass.
+    widths = [len(c) for c in columns]
+    worksheet.write_row(0, 0, columns, header_format)
+    for row_idx, row in enumerate(summary_rows, start=1):
+        for col_idx, col_name in enumerate(columns):
+            value = row.get(col_name)
+            worksheet.write(row_idx, col_idx, value)
+            value_len = len(str(value)) if value is not None else 0
+            if value_len > widths[col_idx]:
+                widths[col_idx] = value_len
+
+    worksheet.autofilter(0, 0, len(summary_rows), len(columns) - 1)
+    for col_idx, width in enumerate(widths):
+        worksheet.set_column(col_idx, col_idx, width + 2)
+    workbook.close()
 
     excel_bytes = buffer.getvalue()
-    file_b64 = base64.b64encode(excel_bytes).decode("utf-8")
+    file_b64 = b64encode(excel_bytes).decode("utf-8")
 
     return {
         "filename": "reimbursely_summary_minggu_ini.xlsx",
@@ -642,88 +1572,6 @@ def export_reimburse_summary_this_week() -> Dict[str, Any]:
     }
 
 
-@tool()
-def extract_all_payment_amounts_from_email(message_id: str) -> Dict[str, Any]:
-    """
-    OCR ALL payment receipt images in this email and extract payment amounts
-    from each attachment.
-
-    Useful when one form has multiple items and each item has a receipt.
-    """
-    service = _get_gmail_service()
-
-    try:
-        msg = (
-            service.users()
-            .messages()
-            .get(userId="me", id=message_id, format="full")
-            .execute()
-        )
-    except HttpError as e:
-        return {
-            "error": "HttpError while fetching message for payment receipts.",
-            "status": e.resp.status,
-            "reason": e._get_reason(),
-            "message_id": message_id,
-        }
-
-    attachments = []
-    _collect_attachments(msg.get("payload"), attachments)
-
-    receipt_atts = _get_receipt_image_attachments(attachments)
-    if not receipt_atts:
-        return {
-            "error": "No image attachments (payment receipts) found in this email.",
-            "message_id": message_id,
-            "attachments_ditemukan": attachments,
-        }
-
-    receipts_result = []
-
-    for att in receipt_atts:
-        try:
-            img_bytes = _download_attachment_bytes(
-                service, message_id, att["attachment_id"]
-            )
-        except HttpError as e:
-            receipts_result.append(
-                {
-                    "filename": att.get("filename"),
-                    "error": "Failed to download attachment.",
-                    "status": e.resp.status,
-                    "reason": e._get_reason(),
-                }
-            )
-            continue
-
-        try:
-            ocr_text = _call_vision_ocr(img_bytes)
-            amounts = _parse_amounts_from_text(ocr_text)
-            selected = amounts[-1] if amounts else None
-        except Exception as e:
-            receipts_result.append(
-                {
-                    "filename": att.get("filename"),
-                    "error": f"OCR failed: {e}",
-                }
-            )
-            continue
-
-        receipts_result.append(
-            {
-                "filename": att.get("filename"),
-                "candidate_amounts": amounts,
-                "selected_amount": selected,
-                "ocr_text_preview": (ocr_text[:300] + "…") if ocr_text else "",
-            }
-        )
-
-    return {
-        "message_id": message_id,
-        "receipts": receipts_result,
-    }
-
-
 @tool()
 def list_reimburse_emails_this_week(max_results: int = 50) -> Dict[str, Any]:
     """
@@ -759,12 +1607,7 @@ def analyze_reimburse_email(message_id: str) -> Dict[str, Any]:
 
     # 1) Fetch the email
     try:
-        msg = (
-            service.users()
-            .messages()
-            .get(userId="me", id=message_id, format="full")
-            .execute()
-        )
+        msg = _get_message_full(message_id)
 
         # Extract subject from headers
         payload = msg.get("payload", {})
@@ -804,23 +1647,40 @@ def analyze_reimburse_email(message_id: str) -> Dict[str, Any]:
             "attachments_ditemukan": attachments,
         }
 
-    # Download & parse PDF form
-    try:
-        pdf_bytes = _download_attachment_bytes(
-            service, message_id, form_att["attachment_id"]
-        )
-    except HttpError as e:
+    # Fetch the form and every receipt in one attachments batch, so the
+    # whole email costs a single download round-trip. A PDF named with
+    # both hint families (e.g. "bukti_reimburse.pdf") can win the form
+    # scoring and still look like a receipt; never OCR the selected form
+    # as one of its own receipts or its printed totals would feed
+    # reconciliation.
+    receipt_atts = [
+        att
+        for att in _get_receipt_image_attachments(attachments)
+        if att.get("attachment_id") != form_att["attachment_id"]
+    ]
+    fetched = _download_attachments_batch(
+        service,
+        message_id,
+        [form_att["attachment_id"]]
+        + [att["attachment_id"] for att in receipt_atts],
+    )
+    form_res = fetched[0]
+
+    if not isinstance(form_res, bytes):
         return {
             "error": "HttpError while downloading PDF form.",
-            "status": e.resp.status,
-            "reason": e._get_reason(),
+            "status": getattr(getattr(form_res, "resp", None), "status", None),
+            "reason": form_res._get_reason()
+            if isinstance(form_res, HttpError)
+            else str(form_res),
             "message_id": message_id,
             "attachment_id": form_att.get("attachment_id"),
             "filename": form_att.get("filename"),
         }
 
+    # Parse the PDF form (memoized by content hash)
     try:
-        form_data = _parse_reimburse_form_pdf(pdf_bytes)
+        form_data = copy.deepcopy(_parse_form_pdf_cached(form_res))
     except Exception as e:
         return {
             "error": f"Failed to parse reimbursement PDF form: {e}",
@@ -831,48 +1691,10 @@ def analyze_reimburse_email(message_id: str) -> Dict[str, Any]:
     form_data["source_email_id"] = message_id
     form_data["source_pdf_filename"] = form_att.get("filename")
 
-    # 3) OCR all payment receipt images
-    receipt_atts = _get_receipt_image_attachments(attachments)
-    receipts_result: List[Dict[str, Any]] = []
-
-    for att in receipt_atts:
-        filename = att.get("filename")
-        try:
-            img_bytes = _download_attachment_bytes(
-                service, message_id, att["attachment_id"]
-            )
-        except HttpError as e:
-            receipts_result.append(
-                {
-                    "filename": filename,
-                    "error": "Failed to download payment receipt attachment.",
-                    "status": e.resp.status,
-                    "reason": e._get_reason(),
-                }
-            )
-            continue
-
-        try:
-            ocr_text = _call_vision_ocr(img_bytes)
-            amounts = _parse_amounts_from_text(ocr_text)
-            selected = amounts[-1] if amounts else None
-        except Exception as e:
-            receipts_result.append(
-                {
-                    "filename": filename,
-                    "error": f"OCR failed: {e}",
-                }
-            )
-            continue
-
-        receipts_result.append(
-            {
-                "filename": filename,
-                "candidate_amounts": amounts,
-                "selected_amount": selected,
-                "ocr_text_preview": (ocr_text[:300] + "…") if ocr_text else "",
-            }
-        )
+    # 3) OCR all payment receipts (prefetched above, batched Vision)
+    receipts_result = _process_receipt_attachments(
+        service, message_id, receipt_atts, download_results=fetched[1:]
+    )
 
     # 4) Reconcile form vs receipts
     reconciliation = _reconcile_form_and_receipts(form_data, receipts_result)
@@ -905,36 +1727,47 @@ def list_reimburse_emails_for_period(start_date: str, end_date: str, max_results
     query = (
         f'("reimburse" OR "reimbursement") '
         f'-subject:advance '
+        f'has:attachment '
         f'(to:{finance_addr} OR cc:{finance_addr}) '
         f'after:{start_date} before:{end_date}'
     )
 
-    resp = (
-        service.users()
-        .messages()
-        .list(userId="me", q=query, maxResults=max_results)
-        .execute()
-    )
-
-    messages = resp.get("messages", [])
-
-    emails: List[Dict[str, Any]] = []
-
-    for m in messages:
-        msg = (
+    # Follow nextPageToken until max_results ids are collected (Gmail caps
+    # a single list() page at 500).
+    message_ids: List[str] = []
+    page_token = None
+    while len(message_ids) < max_results:
+        resp = (
             service.users()
             .messages()
-            .get(
+            .list(
                 userId="me",
-                id=m["id"],
-                format="metadata",
-                metadataHeaders=["Subject", "From", "Date"],
+                q=query,
+                maxResults=min(max_results - len(message_ids), 500),
+                pageToken=page_token,
+                fields="messages/id,nextPageToken",
             )
-            .execute()
+            .execute(http=_get_thread_http())
         )
+        message_ids.extend(m["id"] for m in resp.get("messages", []))
+        page_token = resp.get("nextPageToken")
+        if not page_token:
+            break
+
+    responses = _batch_get_messages_metadata(
+        service, message_ids, ["Subject", "From", "Date"]
+    )
+
+    # Gmail already returns date-bounded queries newest-first, so keeping
+    # the list() order needs no client-side sort.
+    emails: List[Dict[str, Any]] = []
+
+    for msg_id in message_ids:
+        msg = responses.get(msg_id)
+        if not msg:
+            continue
 
-        headers = {h["name"]: h["value"] for h in msg["payload"]["headers"]}
-        subject = headers.get("Subject", "") or ""
+        subject, from_, date_ = _extract_three_headers(msg["payload"]["headers"])
 
         # Skip cash advance / advance fund requests
         if "advance" in subject.lower():
@@ -942,24 +1775,18 @@ def list_reimburse_emails_for_period(start_date: str, end_date: str, max_results
 
         emails.append(
             {
-                "id": m["id"],
+                "id": msg_id,
                 "subject": subject,
-                "from": headers.get("From", ""),
-                "date": headers.get("Date", ""),
-                "internal_ts": int(msg.get("internalDate", 0)),
+                "from": from_,
+                "date": date_,
             }
         )
 
-    # sort newest-first by internalDate
-    emails_sorted = sorted(emails, key=lambda x: x["internal_ts"], reverse=True)
-    for e in emails_sorted:
-        e.pop("internal_ts", None)
-
     return {
         "start_date": start_date,
         "end_date_exclusive": end_date,
-        "count": len(emails_sorted),
-        "emails": emails_sorted,
+        "count": len(emails),
+        "emails": emails,
     }
 
 
@@ -990,12 +1817,7 @@ def extract_all_payment_amounts_from_email(message_id: str) -> Dict[str, Any]:
     service = _get_gmail_service()
 
     try:
-        msg = (
-            service.users()
-            .messages()
-            .get(userId="me", id=message_id, format="full")
-            .execute()
-        )
+        msg = _get_message_payload(message_id)
     except HttpError as e:
         return {
             "error": "HttpError while fetching message for payment receipts.",
@@ -1015,46 +1837,7 @@ def extract_all_payment_amounts_from_email(message_id: str) -> Dict[str, Any]:
             "attachments_ditemukan": attachments,
         }
 
-    receipts_result: List[Dict[str, Any]] = []
-
-    for att in receipt_atts:
-        filename = att.get("filename")
-        try:
-            img_bytes = _download_attachment_bytes(
-                service, message_id, att["attachment_id"]
-            )
-        except HttpError as e:
-            receipts_result.append(
-                {
-                    "filename": filename,
-                    "error": "Failed to download attachment.",
-                    "status": e.resp.status,
-                    "reason": e._get_reason(),
-                }
-            )
-            continue
-
-        try:
-            ocr_text = _call_vision_ocr(img_bytes)
-            amounts = _parse_amounts_from_text(ocr_text)
-            selected = amounts[-1] if amounts else None  # use the largest/last
-        except Exception as e:
-            receipts_result.append(
-                {
-                    "filename": filename,
-                    "error": f"OCR failed: {e}",
-                }
-            )
-            continue
-
-        receipts_result.append(
-            {
-                "filename": filename,
-                "candidate_amounts": amounts,
-                "selected_amount": selected,
-                "ocr_text_preview": (ocr_text[:300] + "…") if ocr_text else "",
-            }
-        )
+    receipts_result = _process_receipt_attachments(service, message_id, receipt_atts)
 
     return {
         "message_id": message_id,
@@ -1075,15 +1858,9 @@ def parse_reimburse_form_from_email(message_id: str) -> Dict[str, Any]:
         Dict containing reimbursement summary (date, items, total, bank info),
         or an error dict if Gmail API / parsing fails.
     """
-    service = _get_gmail_service()
 
     try:
-        msg = (
-            service.users()
-            .messages()
-            .get(userId="me", id=message_id, format="full")
-            .execute()
-        )
+        msg = _get_message_payload(message_id)
     except HttpError as e:
         return {
             "error": "HttpError while fetching message.",
@@ -1092,23 +1869,22 @@ def parse_reimburse_form_from_email(message_id: str) -> Dict[str, Any]:
             "message_id": message_id,
         }
 
-    attachments = []
-    _collect_attachments(msg.get("payload"), attachments)
-
-    # pick the first PDF attachment
-    pdf_att = _select_form_pdf_attachment(attachments)
+    # pick the form PDF in a single payload walk
+    pdf_att = _find_form_pdf_attachment(msg.get("payload"))
 
     if not pdf_att:
+        # full walk only needed for the diagnostic attachment list
+        attachments = []
+        _collect_attachments(msg.get("payload"), attachments)
         return {
             "error": "No PDF attachment found in this email.",
             "message_id": message_id,
             "attachments_ditemukan": attachments,
         }
 
+    # Download + parse, memoized per (message_id, attachment_id)
     try:
-        pdf_bytes = _download_attachment_bytes(
-            service, message_id, pdf_att["attachment_id"]
-        )
+        parsed = _get_parsed_form_pdf(message_id, pdf_att["attachment_id"])
     except HttpError as e:
         return {
             "error": "HttpError while downloading attachment.",
@@ -1118,10 +1894,6 @@ def parse_reimburse_form_from_email(message_id: str) -> Dict[str, Any]:
             "attachment_id": pdf_att.get("attachment_id"),
             "filename": pdf_att.get("filename"),
         }
-
-    # If we get here, download was fine; now parse the PDF.
-    try:
-        parsed = _parse_reimburse_form_pdf(pdf_bytes)
     except Exception as e:
         return {
             "error": f"Failed to parse PDF: {e}",
@@ -1147,26 +1919,29 @@ def get_email_detail(message_id: str) -> Dict[str, Any]:
     Returns:
         Dict containing header fields, body, and attachments.
     """
-    service = _get_gmail_service()
 
-    msg = (
-        service.users()
-        .messages()
-        .get(userId="me", id=message_id, format="full")
-        .execute()
-    )
+    msg = _get_message_full(message_id)
+
+    # Pick just the four headers the response uses; a full message carries
+    # dozens of Received/ARC headers that would only bloat a dict.
+    wanted = {"Subject": "", "From": "", "To": "", "Date": ""}
+    remaining = len(wanted)
+    for h in msg["payload"]["headers"]:
+        name = h.get("name")
+        if name in wanted and not wanted[name]:
+            wanted[name] = h.get("value", "")
+            remaining -= 1
+            if remaining == 0:
+                break
 
-    headers = {h["name"]: h["value"] for h in msg["payload"]["headers"]}
-    body_text = _extract_text_body(msg.get("payload"))
-    attachments = []
-    _collect_attachments(msg.get("payload"), attachments)
+    body_text, attachments = _walk_payload(msg.get("payload"))
 
     return {
         "id": message_id,
-        "subject": headers.get("Subject", ""),
-        "from": headers.get("From", ""),
-        "to": headers.get("To", ""),
-        "date": headers.get("Date", ""),
+        "subject": wanted["Subject"],
+        "from": wanted["From"],
+        "to": wanted["To"],
+        "date": wanted["Date"],
         "snippet": msg.get("snippet", ""),
         "body": body_text,
         "attachments": attachments,
@@ -1190,36 +1965,33 @@ def list_recent_emails(query: str = "", max_results: int = 10) -> List[Dict[str,
     resp = (
         service.users()
         .messages()
-        .list(userId="me", q=query, maxResults=max_results)
-        .execute()
+        .list(userId="me", q=query, maxResults=max_results, fields="messages/id,nextPageToken")
+        .execute(http=_get_thread_http())
     )
     messages = resp.get("messages", [])
 
-    results: List[Dict[str, Any]] = []
+    message_ids = [m["id"] for m in messages]
+    responses = _batch_get_messages_metadata(
+        service, message_ids, ["Subject", "From", "Date"]
+    )
 
-    for m in messages:
-        msg = (
-            service.users()
-            .messages()
-            .get(
-                userId="me",
-                id=m["id"],
-                format="metadata",
-                metadataHeaders=["Subject", "From", "Date"],
-            )
-            .execute()
-        )
+    # Preallocate one slot per id; assembly stays in list() order without
+    # append-growth, and ids the batch dropped leave a None to filter.
+    results: List[Optional[Dict[str, Any]]] = [None] * len(message_ids)
 
-        headers = {h["name"]: h["value"] for h in msg["payload"]["headers"]}
+    for idx, msg_id in enumerate(message_ids):
+        msg = responses.get(msg_id)
+        if not msg:
+            continue
 
-        results.append(
-            {
-                "id": m["id"],
-                "subject": headers.get("Subject", ""),
-                "from": headers.get("From", ""),
-                "date": headers.get("Date", ""),
-                "snippet": msg.get("snippet", ""),
-            }
-        )
+        subject, from_, date_ = _extract_three_headers(msg["payload"]["headers"])
 
-    return results
+        results[idx] = {
+            "id": msg_id,
+            "subject": subject,
+            "from": from_,
+            "date": date_,
+            "snippet": msg.get("snippet", ""),
+        }
+
+    return [r for r in results if r is not None]